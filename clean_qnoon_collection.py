@@ -1,8 +1,11 @@
 import argparse
 import csv
+import os
 import re
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 from pathlib import Path
-from typing import Dict, Tuple, List
+from typing import Dict, Iterator, Tuple, List
 
 # -----------------------------
 # Configurable category mapping
@@ -17,9 +20,17 @@ CATEGORY_FOLDERS: Dict[str, str] = {
     "RO": "Royal Orders",
     "TA": "International Agreements",
 }
+VALID_CATEGORIES = frozenset(CATEGORY_FOLDERS)
 
-# File extensions to process
+# File extensions to process (lowercase); tuple form for str.endswith
 EXTS = {".txt", ".text"}
+EXT_SUFFIXES = tuple(EXTS)
+
+# Buffer size for output files (fewer, larger write syscalls)
+WRITE_BUFFER_SIZE = 1 << 20
+
+# What bytes.strip() removes; str.strip() also removes non-ASCII whitespace
+ASCII_WHITESPACE = " \t\n\r\x0b\x0c"
 
 # -----------------------------
 # Cleaning rules
@@ -30,14 +41,23 @@ EXTS = {".txt", ".text"}
 # 2) "تحميل" + "English"
 # 3) "تحميل" + "تحميل"
 #
-# We do it as a loop: keep stripping these leading lines until they stop appearing.
+# Any leading run of such lines (plus blank lines) is consumed by one anchored regex match.
 #
 # Notes:
-# - Arabic "تحميل" can appear with stray spaces; we strip whitespace on each line.
+# - Arabic "تحميل" can appear with stray spaces; surrounding whitespace on each line is ignored.
 # - "English" case-insensitive matching.
 # - We do not remove these tokens if they appear later in the document; only at start.
 DOWNLOAD_AR = "تحميل"
 
+# One leading line: optional whitespace, optional "تحميل"/"English", optional whitespace, end of line.
+# The trailing blank run is only allowed after a token, so a line of plain blanks has a single
+# way to match (no quadratic backtracking on a long blank run followed by text).
+LEADING_DOWNLOAD_LINES_RE = re.compile(
+    r"\A(?:[^\S\n]*(?:(?:" + DOWNLOAD_AR + r"|[Ee][Nn][Gg][Ll][Ii][Ss][Hh])[^\S\n]*)?(?:\n|\Z))*"
+)
+
+NON_WHITESPACE_RUN_RE = re.compile(r"\S+")
+
 def normalize_newlines(text: str) -> str:
     text = text.replace("\ufeff", "")  # BOM
     text = text.replace("\r\n", "\n").replace("\r", "\n")
@@ -54,80 +74,78 @@ def strip_leading_download_lines(text: str) -> Tuple[str, int]:
       - 'تحميل' then 'English'
       - 'تحميل' then 'تحميل'
       - repeated occurrences
+    Leading blank lines are removed (and counted) too.
     Returns (cleaned_text, removed_line_count).
     """
-    removed = 0
-    lines = text.split("\n")
-
-    # Remove leading empty lines first
-    while lines and lines[0].strip() == "":
-        lines.pop(0)
-        removed += 1
-
-    # Now repeatedly remove the specified tokens at the start
-    def is_english_line(s: str) -> bool:
-        return s.strip().lower() == "english"
-
-    def is_download_line(s: str) -> bool:
-        return s.strip() == DOWNLOAD_AR
-
-    changed = True
-    while changed:
-        changed = False
-
-        # Trim leading empties
-        while lines and lines[0].strip() == "":
-            lines.pop(0)
-            removed += 1
-            changed = True
-
-        if not lines:
-            break
-
-        # Case: first line is "تحميل"
-        if lines and is_download_line(lines[0]):
-            lines.pop(0)
-            removed += 1
-            changed = True
-
-            # After popping "تحميل", also remove a following "English" OR another "تحميل" if present
-            while lines and lines[0].strip() == "":
-                lines.pop(0)
-                removed += 1
-
-            if lines and (is_english_line(lines[0]) or is_download_line(lines[0])):
-                lines.pop(0)
-                removed += 1
-
-            continue
-
-        # (Rare) If file starts with "English" alone, remove it too
-        if lines and is_english_line(lines[0]):
-            lines.pop(0)
-            removed += 1
-            changed = True
-            continue
-
-    cleaned = "\n".join(lines).strip()
-    return cleaned, removed
+    end = LEADING_DOWNLOAD_LINES_RE.match(text).end()
+    if end == len(text):
+        # Nothing but download/blank lines
+        return "", text.count("\n") + 1
+    return text[end:].strip(), text.count("\n", 0, end)
 
 def has_useful_content(text: str, min_chars: int) -> bool:
-    # After stripping whitespace, must meet minimum threshold
-    return len(re.sub(r"\s+", "", text)) >= min_chars
+    # Non-whitespace characters must meet minimum threshold; stop counting once they do
+    if len(text) < min_chars:
+        return False
+    remaining = min_chars
+    for m in NON_WHITESPACE_RUN_RE.finditer(text):
+        remaining -= m.end() - m.start()
+        if remaining <= 0:
+            return True
+    return remaining <= 0
 
 # -----------------------------
 # Path helpers
 # -----------------------------
-def infer_category_folder(input_root: Path, file_path: Path) -> str:
-    rel = file_path.relative_to(input_root)
-    return rel.parts[0] if rel.parts else "UNKNOWN"
+def walk_text_files(root: str) -> Iterator[str]:
+    """
+    Recursively yield paths (str) of files under root whose extension is in EXTS.
+    os.scandir hands back cached file-type info, so no extra stat() per entry,
+    and only the plain path string leaves the walk.
+    """
+    with os.scandir(root) as it:
+        for entry in it:
+            if entry.is_dir(follow_symlinks=False):
+                yield from walk_text_files(entry.path)
+            elif entry.name.lower().endswith(EXT_SUFFIXES) and entry.is_file():
+                yield entry.path
 
-def within_configured_categories(category: str) -> bool:
-    return category in CATEGORY_FOLDERS
+def infer_category_folder(rel_path: str) -> str:
+    return rel_path.split(os.sep, 1)[0] if rel_path else "UNKNOWN"
 
 def ensure_parent(p: Path) -> None:
     p.parent.mkdir(parents=True, exist_ok=True)
 
+# -----------------------------
+# Per-file worker
+# -----------------------------
+def clean_file(path: str, min_chars: int) -> Tuple[int, bool, bytes]:
+    """
+    Read and clean a single file. Pure (no shared state) so it can run in a worker process.
+    Returns (removed_line_count, kept, output_bytes); writing is left to the caller.
+    """
+    with open(path, "rb") as f:
+        raw_bytes = f.read()
+    try:
+        decoded = raw_bytes.decode("utf-8")
+        lossless = True
+    except UnicodeDecodeError:
+        decoded = raw_bytes.decode("utf-8", errors="ignore")
+        lossless = False
+    raw = normalize_newlines(decoded)
+
+    cleaned_text, removed_lines = strip_leading_download_lines(raw)
+
+    if has_useful_content(cleaned_text, min_chars):
+        return removed_lines, True, (cleaned_text + "\n").encode("utf-8")
+
+    # Save the original raw for audit, not the cleaned empty text.
+    # If decoding and normalizing changed nothing, the stripped source bytes already are that text.
+    stripped = raw.strip()
+    if lossless and raw == decoded and stripped == raw.strip(ASCII_WHITESPACE):
+        return removed_lines, False, raw_bytes.strip() + b"\n"
+    return removed_lines, False, (stripped + "\n").encode("utf-8")
+
 # -----------------------------
 # Main
 # -----------------------------
@@ -135,6 +153,8 @@ def main():
 
     # Minimum non-whitespace characters required after cleaning to keep the file
     MIN_CONTENT_CHARS = 50
+    # Worker processes: all cores but one
+    DEFAULT_WORKERS = max(1, (os.cpu_count() or 2) - 1)
 
     ap = argparse.ArgumentParser(description="Clean qanoon text collection: remove leading 'تحميل/English' lines, discard empty files, mirror output structure, and produce CSV stats.")
     ap.add_argument("--input_root", required=True, help="Path to the root collection directory (contains category subfolders).")
@@ -142,6 +162,7 @@ def main():
     ap.add_argument("--min_chars", type=int, default=MIN_CONTENT_CHARS, help="Minimum non-whitespace characters required to keep a file.")
     ap.add_argument("--include_uncategorized", action="store_true", help="If set, process files even if top-level folder isn't in CATEGORY_FOLDERS.")
     ap.add_argument("--report_csv", default="cleaning_report.csv", help="CSV filename for per-category stats (written inside output_root).")
+    ap.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Number of worker processes used to clean files in parallel.")
     args = ap.parse_args()
 
     input_root = Path(args.input_root).expanduser().resolve()
@@ -161,53 +182,51 @@ def main():
 
     processed_files = 0
 
-    for fp in input_root.rglob("*"):
-        if not fp.is_file():
-            continue
-        if fp.suffix.lower() not in EXTS:
+    # Collect the work list once; cleaning runs in worker processes, writing stays here
+    files: List[Tuple[str, str, str]] = []  # (path, rel, cat)
+    root_str = str(input_root)
+    # scandir paths are root_str + os.sep + rel, so rel is a plain slice
+    root_len = len(os.path.join(root_str, ""))
+    for path in walk_text_files(root_str):
+        rel = path[root_len:]
+        cat = infer_category_folder(rel)
+        if not args.include_uncategorized and cat not in VALID_CATEGORIES:
             continue
-
-        cat = infer_category_folder(input_root, fp)
-        if not args.include_uncategorized and not within_configured_categories(cat):
-            continue
-
-        bump(cat, "processed", 1)
-        processed_files += 1
-
-        raw = fp.read_text(encoding="utf-8", errors="ignore")
-        raw = normalize_newlines(raw)
-
-        cleaned_text, removed_lines = strip_leading_download_lines(raw)
-        bump(cat, "removed_lines_total", removed_lines)
-
-        rel = fp.relative_to(input_root)
-
-        if has_useful_content(cleaned_text, args.min_chars):
-            out_path = cleaned_root / rel
-            ensure_parent(out_path)
-            out_path.write_text(cleaned_text + "\n", encoding="utf-8")
-            bump(cat, "cleaned", 1)
-        else:
-            out_path = discarded_root / rel
+        files.append((path, rel, cat))
+
+    worker = partial(clean_file, min_chars=args.min_chars)
+    with ProcessPoolExecutor(max_workers=max(1, args.workers)) as ex:
+        results = ex.map(worker, [path for path, _, _ in files], chunksize=64)
+        for (_, rel, cat), (removed_lines, kept, data) in zip(files, results):
+            bump(cat, "processed", 1)
+            processed_files += 1
+            bump(cat, "removed_lines_total", removed_lines)
+
+            if kept:
+                out_path = cleaned_root / rel
+                bump(cat, "cleaned", 1)
+            else:
+                out_path = discarded_root / rel
+                bump(cat, "discarded", 1)
             ensure_parent(out_path)
-            # Save the original raw for audit, not the cleaned empty text
-            out_path.write_text(raw.strip() + "\n", encoding="utf-8")
-            bump(cat, "discarded", 1)
+            out_path.write_bytes(data)
 
     # Write CSV report
     report_path = output_root / args.report_csv
-    with report_path.open("w", encoding="utf-8", newline="") as f:
+    with report_path.open("w", encoding="utf-8", newline="", buffering=WRITE_BUFFER_SIZE) as f:
         w = csv.writer(f)
         w.writerow(["category_folder", "category_name", "processed", "cleaned", "discarded", "removed_lines_total"])
-        for cat in sorted(stats.keys(), key=lambda x: x.lower()):
-            w.writerow([
+        w.writerows([
+            [
                 cat,
                 CATEGORY_FOLDERS.get(cat, cat),
                 stats[cat]["processed"],
                 stats[cat]["cleaned"],
                 stats[cat]["discarded"],
                 stats[cat]["removed_lines_total"],
-            ])
+            ]
+            for cat in sorted(stats.keys(), key=lambda x: x.lower())
+        ])
 
     print("\n=== Cleaning completed ===")
     print(f"Input root:      {input_root}")
@@ -4,8 +4,17 @@ import json
 import os
 import random
 import re
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+from functools import partial
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    import orjson  # optional: much faster JSON encoding, emits UTF-8 bytes directly
+except ImportError:
+    orjson = None
 
 # -----------------------
 # Defaults you can edit
@@ -21,6 +30,22 @@ DEFAULT_CATEGORY_LABELS: Dict[str, str] = {
 
 DEFAULT_EXTS = [".txt", ".text"]
 
+# Buffer size for output files (fewer, larger write syscalls)
+WRITE_BUFFER_SIZE = 1 << 20
+
+# Records held in memory to shuffle the stream before it is split into train/val
+SHUFFLE_BUFFER_SIZE = 8192
+
+# Patterns used per document (compiled once)
+SPACES_RE = re.compile(r"[ \t]+")
+BLANK_LINES_RE = re.compile(r"\n{3,}")
+NON_WHITESPACE_RUN_RE = re.compile(r"\S+")
+# Lines that begin with المادة/مادة and a number; zero-width so the marker stays with its text
+ARTICLE_START_RE = re.compile(r"(?m)^(?=\s*(?:المادة|مادة)\s+\(?\d+\)?)")
+PARAGRAPH_BREAK_RE = re.compile(r"\n\s*\n")
+# A separator line holding only whitespace, e.g. "\n \n" (plain "\n\n" splits need no regex)
+BLANKISH_LINE_RE = re.compile(r"\n[^\S\n]+\n")
+
 # -----------------------
 # Text helpers
 # -----------------------
@@ -28,14 +53,32 @@ def normalize_newlines(text: str) -> str:
     text = text.replace("\ufeff", "")  # BOM
     text = text.replace("\r\n", "\n").replace("\r", "\n")
     text = text.replace("\u200f", "").replace("\u200e", "")
+    return collapse_whitespace(text)
+
+def collapse_whitespace(text: str) -> str:
     # collapse excessive whitespace
-    text = re.sub(r"[ \t]+", " ", text)
-    text = re.sub(r"\n{3,}", "\n\n", text)
+    text = SPACES_RE.sub(" ", text)
+    text = BLANK_LINES_RE.sub("\n\n", text)
     return text.strip()
 
+def decode_normalized(data: bytes) -> str:
+    """
+    Decode and normalize one file. All edits happen after decoding: deleting or
+    rewriting bytes first (marks, CR/LF) could change which invalid bytes end up
+    adjacent, so errors="ignore" would join them into different characters.
+    """
+    return normalize_newlines(data.decode("utf-8", errors="ignore"))
+
 def has_useful_content(text: str, min_chars: int) -> bool:
-    # Count non-whitespace characters
-    return len(re.sub(r"\s+", "", text)) >= min_chars
+    # Count non-whitespace characters, stopping as soon as the threshold is reached
+    if len(text) < min_chars:
+        return False
+    remaining = min_chars
+    for m in NON_WHITESPACE_RUN_RE.finditer(text):
+        remaining -= m.end() - m.start()
+        if remaining <= 0:
+            return True
+    return remaining <= 0
 
 def split_by_articles(text: str) -> Optional[List[str]]:
     """
@@ -43,9 +86,7 @@ def split_by_articles(text: str) -> Optional[List[str]]:
     Returns None if no meaningful split detected.
     """
     # Split while preserving the marker with the following text.
-    # We'll split on lines that begin with المادة/مادة and a number.
-    pattern = r"(?m)^(?=\s*(?:المادة|مادة)\s+\(?\d+\)?)"
-    parts = re.split(pattern, text)
+    parts = ARTICLE_START_RE.split(text)
     parts = [p.strip() for p in parts if p and p.strip()]
     return parts if len(parts) > 1 else None
 
@@ -53,10 +94,41 @@ def chunk_text_paragraphwise(text: str, max_chars: int, overlap_chars: int) -> L
     """
     Paragraph-aware chunking with overlap (character-based).
     """
-    paras = [p.strip() for p in re.split(r"\n\s*\n", text) if p.strip()]
+    # After normalize_newlines paragraphs are separated by "\n\n", so str.split does;
+    # fall back to the regex only when a whitespace-only separator line is present
+    blankish = BLANKISH_LINE_RE.search(text)
+
+    # A short text with no paragraph break is a single chunk as it is. With a break,
+    # paragraphs still go through strip + re-join, which normalizes their edges.
+    if len(text) <= max_chars and not blankish and "\n\n" not in text:
+        text = text.strip()
+        return [text] if text else []
+
+    if blankish:
+        parts = PARAGRAPH_BREAK_RE.split(text)
+    else:
+        parts = text.split("\n\n")
+    paras = [p for p in (s.strip() for s in parts) if p]
     chunks: List[str] = []
-    buf = ""
 
+    def emit(c: str) -> None:
+        # A single massive paragraph (or overlap tail + paragraph) can exceed max_chars.
+        # Hard split it by chars right here (rare, but safe) instead of in a second pass.
+        if len(c) <= max_chars:
+            if c:
+                chunks.append(c)
+            return
+        start = 0
+        while start < len(c):
+            end = min(start + max_chars, len(c))
+            piece = c[start:end].strip()
+            if piece:
+                chunks.append(piece)
+            if end >= len(c):
+                break
+            start = max(0, end - overlap_chars)
+
+    buf = ""
     for p in paras:
         if not buf:
             buf = p
@@ -65,29 +137,14 @@ def chunk_text_paragraphwise(text: str, max_chars: int, overlap_chars: int) -> L
         if len(buf) + len(p) + 2 <= max_chars:
             buf = buf + "\n\n" + p
         else:
-            chunks.append(buf.strip())
+            emit(buf.strip())
             tail = buf[-overlap_chars:] if overlap_chars > 0 else ""
             buf = (tail + "\n\n" + p).strip()
 
     if buf:
-        chunks.append(buf.strip())
-
-    # If the document is a single massive paragraph, the above may create huge chunks.
-    # Fallback: hard split by chars (rare, but safe).
-    hardened: List[str] = []
-    for c in chunks:
-        if len(c) <= max_chars:
-            hardened.append(c)
-        else:
-            start = 0
-            while start < len(c):
-                end = min(start + max_chars, len(c))
-                hardened.append(c[start:end].strip())
-                if end >= len(c):
-                    break
-                start = max(0, end - overlap_chars)
+        emit(buf.strip())
 
-    return [c for c in hardened if c]
+    return chunks
 
 def chunk_document(text: str,
                    max_chars: int,
@@ -113,34 +170,38 @@ def chunk_document(text: str,
 # -----------------------
 # Traversal + dataset build
 # -----------------------
-def infer_category(input_root: Path, file_path: Path) -> str:
-    rel = file_path.relative_to(input_root)
-    return rel.parts[0] if rel.parts else "UNKNOWN"
+def iter_text_files(root: Path, exts: List[str]) -> List[str]:
+    """
+    Walk root once with os.scandir and return sorted file paths (as str) whose
+    name ends with one of exts (case-insensitive). Names are filtered before the
+    is_file() check, so other files never cost a stat().
+    """
+    ext_tuple = tuple(e.lower() for e in exts)
+    files: List[str] = []
 
-def iter_text_files(root: Path, exts: List[str]) -> List[Path]:
-    files: List[Path] = []
-    for ext in exts:
-        files.extend(root.rglob(f"*{ext}"))
-    return sorted([p for p in files if p.is_file()])
+    def walk(d: str) -> None:
+        with os.scandir(d) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    walk(entry.path)
+                elif entry.name.lower().endswith(ext_tuple) and entry.is_file():
+                    files.append(entry.path)
+
+    walk(str(root))
+    return sorted(files)
 
 def choose_min_chars(category: str, default_min: int, overrides: Dict[str, int]) -> int:
     return overrides.get(category, default_min)
 
-def build_header(category_code: str,
-                 category_labels: Dict[str, str],
-                 rel_path: str,
-                 chunk_index: int,
-                 chunk_total: int,
-                 include_header: bool) -> str:
-    if not include_header:
-        return ""
-    label = category_labels.get(category_code, category_code)
+def build_header_prefix(label: str, rel_path: str) -> str:
+    """
+    Metadata header lines shared by every chunk of a document;
+    only the '[الجزء]: i/n' line that follows is per chunk.
+    """
     return (
         f"[نوع_المستند]: {label}\n"
         f"[المصدر]: qanoon.om\n"
         f"[المسار]: {rel_path}\n"
-        f"[الجزء]: {chunk_index}/{chunk_total}\n"
-        "النص:\n"
     )
 
 def maybe_cap_chunks(chunks: List[str], cap: int, rng: random.Random) -> List[str]:
@@ -150,11 +211,40 @@ def maybe_cap_chunks(chunks: List[str], cap: int, rng: random.Random) -> List[st
     idxs = sorted(rng.sample(range(len(chunks)), cap))
     return [chunks[i] for i in idxs]
 
-def write_jsonl(records: List[dict], path: Path) -> None:
-    path.parent.mkdir(parents=True, exist_ok=True)
-    with path.open("w", encoding="utf-8") as f:
-        for r in records:
-            f.write(json.dumps(r, ensure_ascii=False) + "\n")
+def dumps_jsonl(record: dict) -> bytes:
+    """
+    One JSONL line as UTF-8 bytes with non-ASCII left unescaped
+    (orjson when installed, otherwise json.dumps(ensure_ascii=False)).
+    """
+    if orjson is not None:
+        return orjson.dumps(record, option=orjson.OPT_APPEND_NEWLINE)
+    return (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+
+def iter_uniforms(rng: np.random.Generator, block_size: int = SHUFFLE_BUFFER_SIZE) -> Iterator[float]:
+    """
+    Endless stream of uniform [0, 1) floats, generated by numpy a block at a time
+    (one C call per block instead of one Python-level RNG call per draw).
+    """
+    while True:
+        yield from rng.random(block_size).tolist()
+
+def buffered_shuffle(records: Iterable[dict], rng: np.random.Generator, buffer_size: int) -> Iterator[dict]:
+    """
+    Approximate shuffle in O(buffer_size) memory: once the buffer is full, each incoming
+    record replaces (and emits) a random buffered one; the remainder is emitted in a
+    random permutation at the end.
+    """
+    uniforms = iter_uniforms(rng)
+    buf: List[dict] = []
+    for rec in records:
+        if len(buf) < buffer_size:
+            buf.append(rec)
+            continue
+        i = int(next(uniforms) * buffer_size)
+        out, buf[i] = buf[i], rec
+        yield out
+    for i in rng.permutation(len(buf)).tolist():
+        yield buf[i]
 
 def parse_overrides(s: str) -> Dict[str, int]:
     """
@@ -173,6 +263,48 @@ def parse_overrides(s: str) -> Dict[str, int]:
         out[k.strip()] = int(v.strip())
     return out
 
+def process_file(task: Tuple[str, str, str],
+                 cat_labels: Dict[str, str],
+                 cat_min_chars: Dict[str, int],
+                 max_chars: int,
+                 overlap_chars: int,
+                 use_article_split: bool,
+                 max_chunks_per_doc: int,
+                 include_header: bool,
+                 seed: int) -> Tuple[bool, int, List[dict]]:
+    """
+    Read, filter and chunk one (path, rel_path, category) task.
+    Pure function for worker processes: returns (kept, chunks_capped_away, records).
+    The cap sampler is seeded per file so output does not depend on worker scheduling.
+    """
+    fp, rel_path, cat = task
+    with open(fp, "rb") as f:
+        text = decode_normalized(f.read())
+
+    if not has_useful_content(text, min_chars=cat_min_chars[cat]):
+        return False, 0, []
+
+    chunks = chunk_document(
+        text=text,
+        max_chars=max_chars,
+        overlap_chars=overlap_chars,
+        use_article_split=use_article_split and (cat == "RD" or cat == "FATWA" or cat == "AD"),
+    )
+
+    # cap chunks per doc (avoid mega docs)
+    before = len(chunks)
+    chunks = maybe_cap_chunks(chunks, max_chunks_per_doc, random.Random(f"{seed}:{rel_path}"))
+
+    # build records
+    if include_header:
+        prefix = build_header_prefix(cat_labels[cat], rel_path)
+        n = len(chunks)
+        records = [{"text": f"{prefix}[الجزء]: {i}/{n}\nالنص:\n{ch}"}
+                   for i, ch in enumerate(chunks, start=1)]
+    else:
+        records = [{"text": ch} for ch in chunks]
+    return True, before - len(chunks), records
+
 def main():
     ap = argparse.ArgumentParser(
         description="Prepare Axolotl CPT JSONL (train/val) from cleaned qanoon text corpus."
@@ -221,6 +353,10 @@ def main():
     ap.add_argument("--dry_run", action="store_true",
                     help="Compute stats only; do not write JSONL outputs.")
 
+    # Parallelism
+    ap.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) - 1),
+                    help="Number of worker processes used to read and chunk files (default: all cores but one).")
+
     args = ap.parse_args()
 
     input_root = Path(args.input_root).expanduser().resolve()
@@ -240,82 +376,92 @@ def main():
 
     overrides = parse_overrides(args.min_chars_overrides)
 
-    rng = random.Random(args.seed)
+    rng = np.random.default_rng(args.seed)
 
     # Stats containers
     stats = {c: {"files_seen": 0, "files_kept": 0, "files_discarded": 0,
                  "chunks_written": 0, "chunks_capped_away": 0} for c in keep_set}
     total_files_seen = 0
 
-    all_records: List[dict] = []
-
-    files = iter_text_files(input_root, exts)
-
-    for fp in files:
-        cat = infer_category(input_root, fp)
+    tasks: List[Tuple[str, str, str]] = []  # (path, rel_path, category)
+    # scandir paths are root + os.sep + rel, so rel is a plain slice
+    root_len = len(os.path.join(str(input_root), ""))
+    for fp in iter_text_files(input_root, exts):
+        rel = fp[root_len:]
+        cat = rel.split(os.sep, 1)[0]  # top-level folder
         if cat not in keep_set:
             continue
 
         total_files_seen += 1
         stats[cat]["files_seen"] += 1
+        tasks.append((fp, rel.replace(os.sep, "/"), cat))
+
+    # Resolve per-category settings once instead of per file
+    cat_labels = {c: labels.get(c, c) for c in keep_set}
+    cat_min_chars = {c: choose_min_chars(c, args.min_chars_default, overrides) for c in keep_set}
+
+    worker = partial(
+        process_file,
+        cat_labels=cat_labels,
+        cat_min_chars=cat_min_chars,
+        max_chars=args.max_chars,
+        overlap_chars=args.overlap_chars,
+        use_article_split=args.use_article_split,
+        max_chunks_per_doc=args.max_chunks_per_doc,
+        include_header=args.include_header,
+        seed=args.seed,
+    )
 
-        raw = fp.read_text(encoding="utf-8", errors="ignore")
-        text = normalize_newlines(raw)
-
-        min_chars = choose_min_chars(cat, args.min_chars_default, overrides)
-        if not has_useful_content(text, min_chars=min_chars):
-            stats[cat]["files_discarded"] += 1
-            continue
-
-        stats[cat]["files_kept"] += 1
-
-        rel_path = fp.relative_to(input_root).as_posix()
-        chunks = chunk_document(
-            text=text,
-            max_chars=args.max_chars,
-            overlap_chars=args.overlap_chars,
-            use_article_split=args.use_article_split and (cat == "RD" or cat == "FATWA" or cat == "AD"),
-        )
-
-        # cap chunks per doc (avoid mega docs)
-        before = len(chunks)
-        chunks = maybe_cap_chunks(chunks, args.max_chunks_per_doc, rng)
-        after = len(chunks)
-        if after < before:
-            stats[cat]["chunks_capped_away"] += (before - after)
-
-        # build records
-        for i, ch in enumerate(chunks, start=1):
-            header = build_header(cat, labels, rel_path, i, len(chunks), args.include_header)
-            all_records.append({"text": header + ch})
-
-        stats[cat]["chunks_written"] += len(chunks)
+    def iter_records() -> Iterator[dict]:
+        with ProcessPoolExecutor(max_workers=max(1, args.workers)) as ex:
+            for (_, _, cat), (kept, capped_away, records) in zip(tasks, ex.map(worker, tasks, chunksize=64)):
+                if not kept:
+                    stats[cat]["files_discarded"] += 1
+                    continue
+                stats[cat]["files_kept"] += 1
+                stats[cat]["chunks_capped_away"] += capped_away
+                stats[cat]["chunks_written"] += len(records)
+                yield from records
 
-    # Shuffle records to mix categories
-    rng.shuffle(all_records)
+    train_path = output_dir / args.train_name
+    val_path = output_dir / args.val_name
+    output_dir.mkdir(parents=True, exist_ok=True)
 
-    # Split train/val by chunks (simple, effective for CPT)
-    val_size = max(1, int(len(all_records) * args.val_ratio)) if all_records else 0
-    val_records = all_records[:val_size]
-    train_records = all_records[val_size:]
+    # Shuffle records to mix categories and split train/val by chunks as they stream
+    # (simple, effective for CPT); the first record always goes to val so it is never empty.
+    split_counts = {"train": 0, "val": 0}
+    with ExitStack() as stack:
+        outputs = {}
+        if not args.dry_run:
+            outputs = {
+                split: stack.enter_context(path.open("wb", buffering=WRITE_BUFFER_SIZE))
+                for split, path in (("train", train_path), ("val", val_path))
+            }
+        split_draws = iter_uniforms(rng)
+        for rec in buffered_shuffle(iter_records(), rng, SHUFFLE_BUFFER_SIZE):
+            split = "val" if next(split_draws) < args.val_ratio or not split_counts["val"] else "train"
+            split_counts[split] += 1
+            if outputs:
+                outputs[split].write(dumps_jsonl(rec))
 
     # Reporting
     stats_path = output_dir / args.stats_csv
-    output_dir.mkdir(parents=True, exist_ok=True)
-    with stats_path.open("w", encoding="utf-8", newline="") as f:
-        f.write("category,files_seen,files_kept,files_discarded,chunks_written,chunks_capped_away\n")
-        for cat in keep_cats:
-            s = stats.get(cat, None)
-            if not s:
-                continue
-            f.write(f"{cat},{s['files_seen']},{s['files_kept']},{s['files_discarded']},"
+    rows = ["category,files_seen,files_kept,files_discarded,chunks_written,chunks_capped_away\n"]
+    for cat in keep_cats:
+        s = stats.get(cat, None)
+        if not s:
+            continue
+        rows.append(f"{cat},{s['files_seen']},{s['files_kept']},{s['files_discarded']},"
                     f"{s['chunks_written']},{s['chunks_capped_away']}\n")
+    with stats_path.open("w", encoding="utf-8", newline="") as f:
+        f.write("".join(rows))
 
     print("\n=== CPT Prep Summary ===")
     print(f"Input root: {input_root}")
     print(f"Keep categories: {', '.join(keep_cats)}")
     print(f"max_chars={args.max_chars}, overlap_chars={args.overlap_chars}, use_article_split={args.use_article_split}")
-    print(f"Records (chunks): total={len(all_records)} train={len(train_records)} val={len(val_records)}")
+    print(f"Records (chunks): total={split_counts['train'] + split_counts['val']} "
+          f"train={split_counts['train']} val={split_counts['val']}")
     print(f"Stats CSV: {stats_path}")
 
     for cat in keep_cats:
@@ -328,11 +474,6 @@ def main():
         print("\nDry-run mode: JSONL files were NOT written.")
         return
 
-    train_path = output_dir / args.train_name
-    val_path = output_dir / args.val_name
-    write_jsonl(train_records, train_path)
-    write_jsonl(val_records, val_path)
-
     print(f"Train JSONL: {train_path}")
     print(f"Val JSONL:   {val_path}")
 
@@ -7,44 +7,29 @@ PROJECT_ROOT = Path(__file__).resolve().parent
 FILES_DIR    = PROJECT_ROOT / "downloads"         # downloads/RD/, downloads/AD/, ...
 
 
-class LawFilesPipeline:
+class LawStoragePipeline:
     """
-    Saves each item's raw_content into a text file.
+    Saves each item's raw_content into a text file and persists
+    page_id, url, content_type, file_path into SQLite, in one pass per item.
     Folder name == content_type (RD, AD, ...).
     Adds the absolute path into item['file_path'].
+    Rows are buffered and written with executemany() in one transaction per batch;
+    WAL + synchronous=NORMAL keeps commits from fsync'ing the main DB file each time.
     """
 
+    DB_FILE    = PROJECT_ROOT / "laws.db"
+    BATCH_SIZE = 500
+
     def open_spider(self, spider):
         FILES_DIR.mkdir(exist_ok=True)
+        self.folders = set()                         # content-type folders already created
 
-    def process_item(self, item, spider):
-        ctype = item.get("content_type")
-        if not ctype:
-            raise DropItem("Unknown content type")
-
-        folder = FILES_DIR / ctype
-        folder.mkdir(exist_ok=True)
-
-        filename = f"{item['page_id']}.txt"
-        path     = folder / filename
-        path.write_text(item["raw_content"], encoding="utf-8")
-
-        item["file_path"] = str(path)
-        # raw_content no longer needed downstream
-        item.pop("raw_content", None)
-        return item
-
-
-class SQLitePipeline:
-    """
-    Persists page_id, url, content_type, file_path into SQLite.
-    """
-
-    DB_FILE = PROJECT_ROOT / "laws.db"
-
-    def open_spider(self, spider):
-        self.conn = sqlite3.connect(self.DB_FILE)
-        self.cur  = self.conn.cursor()
+        self.conn  = sqlite3.connect(self.DB_FILE)
+        self.cur   = self.conn.cursor()
+        self.batch = []
+        self.cur.execute("PRAGMA journal_mode=WAL")
+        self.cur.execute("PRAGMA synchronous=NORMAL")
+        self.cur.execute("PRAGMA temp_store=MEMORY")
         self.cur.execute(
             """CREATE TABLE IF NOT EXISTS laws (
                    page_id      TEXT PRIMARY KEY,
@@ -53,16 +38,40 @@ class SQLitePipeline:
                    file_path    TEXT
                )"""
         )
+        self.cur.execute("CREATE INDEX IF NOT EXISTS ix_laws_ctype ON laws(content_type)")
         self.conn.commit()
 
     def close_spider(self, spider):
-        self.conn.commit()
+        self.flush()
         self.conn.close()
 
+    def flush(self):
+        if not self.batch:
+            return
+        self.cur.executemany("INSERT OR REPLACE INTO laws VALUES (?, ?, ?, ?)", self.batch)
+        self.conn.commit()
+        self.batch.clear()
+
     def process_item(self, item, spider):
-        self.cur.execute(
-            "INSERT OR REPLACE INTO laws VALUES (?, ?, ?, ?)",
-            (item["page_id"], item["url"], item["content_type"], item["file_path"]),
-        )
-        return item
+        ctype = item.get("content_type")
+        if not ctype:
+            raise DropItem("Unknown content type")
+
+        folder = FILES_DIR / ctype
+        if ctype not in self.folders:
+            folder.mkdir(exist_ok=True)
+            self.folders.add(ctype)
+
+        page_id = item["page_id"]
+        path    = folder / f"{page_id}.txt"
+        path.write_bytes(item["raw_content"].encode("utf-8"))
 
+        file_path = str(path)
+        item["file_path"] = file_path
+        # raw_content no longer needed downstream
+        item.pop("raw_content", None)
+
+        self.batch.append((page_id, item["url"], ctype, file_path))
+        if len(self.batch) >= self.BATCH_SIZE:
+            self.flush()
+        return item
@@ -61,8 +61,7 @@ ROBOTSTXT_OBEY = False
 #}
 
 ITEM_PIPELINES = {
-    "qanoonSpider.pipelines.LawFilesPipeline": 300,
-    "qanoonSpider.pipelines.SQLitePipeline":   400,
+    "qanoonSpider.pipelines.LawStoragePipeline": 300,
 }
 
 # Enable and configure the AutoThrottle extension (disabled by default)
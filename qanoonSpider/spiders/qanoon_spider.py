@@ -1,5 +1,6 @@
 import re
 from urllib.parse import urlparse
+from lxml import etree
 from scrapy.spiders import CrawlSpider, Rule # type: ignore
 from scrapy.linkextractors import LinkExtractor # type: ignore
 from qanoonSpider.items import LawItem
@@ -21,22 +22,31 @@ START_URLS = {
     "FATWA": "https://qanoon.om/p/category/%d9%81%d8%aa%d8%a7%d9%88%d9%89-%d9%82%d8%a7%d9%86%d9%88%d9%86%d9%8a%d8%a9/",
 }
 
+# Text nodes inside div.entry-content: the XPath that css("div.entry-content ::text")
+# expands to, compiled once and run on the raw lxml tree (plain str results, no Selector per node)
+ENTRY_CONTENT_TEXT = etree.XPath(
+    "descendant-or-self::div[@class and contains(@class, 'entry-content') and "
+    "contains(concat(' ', normalize-space(@class), ' '), ' entry-content ')]"
+    "/descendant-or-self::text()",
+    smart_strings=False,
+)
+
+# All RULES as one alternation of named groups; alternatives keep RULES order,
+# so a path that fits several patterns still resolves to the first one (RD before AD)
+SECTION_RE = re.compile("|".join(f"(?P<{key}>{pat.pattern})" for key, pat in RULES.items()))
+
 def which_section(url_path: str):
     """Return RD|AD|RO|TA|FATWA or None."""
-    for key, pat in RULES.items():
-        if pat.search(url_path):
-            return key
-    return None
+    m = SECTION_RE.search(url_path)
+    return m.lastgroup if m else None
 
 
 class QanoonSpider(CrawlSpider):
     name = "qanoonSpider"
 
-    # build one Rule per pattern so CrawlSpider keeps following pagination links
+    # one Rule for all detail-page patterns (a single LinkExtractor pass per response)
     rules = [
-        Rule(LinkExtractor(allow=[pat.pattern]), callback="parse_detail", follow=False)
-        for pat in RULES.values()
-    ] + [
+        Rule(LinkExtractor(allow=[pat.pattern for pat in RULES.values()]), callback="parse_detail", follow=False),
         # also follow everything inside the category pages (pagination, etc.)
         Rule(LinkExtractor(allow=[r"/p/category/"]), follow=True),
     ]
@@ -56,8 +66,8 @@ class QanoonSpider(CrawlSpider):
         page_id    = path.rstrip("/").split("/")[-1]        # rd2024041, etc.
 
         # Extract text inside div.entry-content
-        text_parts = response.css("div.entry-content ::text").getall()
-        content    = "\n".join(p.strip() for p in text_parts if p.strip())
+        text_parts = ENTRY_CONTENT_TEXT(response.selector.root)
+        content    = "\n".join(filter(None, map(str.strip, text_parts)))
 
         item = LawItem(
             page_id      = page_id,
@@ -1,21 +1,59 @@
 import os
 import re
 import csv
+import mmap
 import math
 import json
+import heapq
+import random
 import argparse
+import multiprocessing as mp
 from pathlib import Path
-from statistics import median
+from typing import NamedTuple
 
-ARABIC_LETTERS_RE = re.compile(r"[\u0600-\u06FF]")
-ARABIC_DIACRITICS_RE = re.compile(r"[\u0610-\u061A\u064B-\u065F\u0670\u06D6-\u06ED]")
+import numpy as np
+
+# Codepoint ranges (inclusive) counted by count_arabic_chars:
+# Arabic block [\u0600-\u06FF]; diacritics [\u0610-\u061A\u064B-\u065F\u0670\u06D6-\u06ED]
+ARABIC_RANGE = (0x0600, 0x06FF)
+ARABIC_DIACRITIC_RANGES = ((0x0610, 0x061A), (0x064B, 0x065F), (0x0670, 0x0670), (0x06D6, 0x06ED))
+# Diacritic lookup over the Arabic block, indexed by codepoint - 0x0600
+ARABIC_DIACRITIC_LUT = np.zeros(ARABIC_RANGE[1] - ARABIC_RANGE[0] + 1, dtype=bool)
+for _lo, _hi in ARABIC_DIACRITIC_RANGES:
+    ARABIC_DIACRITIC_LUT[_lo - ARABIC_RANGE[0]:_hi - ARABIC_RANGE[0] + 1] = True
+# Codepoints str.split() treats as whitespace (none above U+3000)
+WHITESPACE_CPS = np.array([c for c in range(0x3001) if chr(c).isspace()], dtype=np.uint32)
+
+# Only runs of 2+ blanks or a tab change under sub(" "); single spaces are left as-is,
+# so typical prose needs no replacement at all
+SPACES_RE = re.compile(r"[ \t]{2,}|\t")
+MULTI_NEWLINE_RE = re.compile(r"\n{3,}")
+# BOM and RTL/LTR marks, deleted in one str.translate pass
+INVISIBLE_MARKS_TABLE = str.maketrans("", "", "\ufeff\u200f\u200e")
+ARTICLE_MARKER_RE = re.compile(r"(?:\n|^)\s*(?:المادة|مادة)\s+\(?\d+\)?")
+
+# CSV columns; per-file rows are tuples in this order
+FILE_FIELDS = (
+    "category","rel_path","chars","words","lines","tok_est_low","tok_est_high","arabic_ratio","diacritics_count","article_markers"
+)
+CATEGORY_FIELDS = (
+    "category","files","total_chars","min_chars","median_chars","p90_chars","p95_chars","max_chars"
+)
+# Files at least this large are decoded straight from an mmap (no intermediate bytes copy)
+MMAP_MIN_SIZE = 1 << 20
+
+# Buffer size for the streamed per-file CSV
+WRITE_BUFFER_SIZE = 1 << 20
+
+# Char lengths kept per category for quantiles (quantiles are exact up to this many files)
+RESERVOIR_SIZE = 65536
 
 def normalize_text(s: str) -> str:
-    # remove invisible marks / BOM
-    s = s.replace("\ufeff", "").replace("\u200f", "").replace("\u200e", "")
+    # remove invisible marks / BOM (one pass)
+    s = s.translate(INVISIBLE_MARKS_TABLE)
     # normalize whitespace
-    s = re.sub(r"[ \t]+", " ", s)
-    s = re.sub(r"\n{3,}", "\n\n", s)
+    s = SPACES_RE.sub(" ", s)
+    s = MULTI_NEWLINE_RE.sub("\n\n", s)
     return s.strip()
 
 def estimate_tokens(text: str) -> tuple[int, int]:
@@ -25,48 +63,183 @@ def estimate_tokens(text: str) -> tuple[int, int]:
     We'll output two estimates (low/high) to get a range.
     """
     n = len(text)
-    est_low = math.ceil(n / 5.0)   # fewer tokens
-    est_high = math.ceil(n / 3.5)  # more tokens
+    # integer ceilings: ceil(n / 5) and ceil(n / 3.5) == ceil(2n / 7)
+    est_low = (n + 4) // 5         # fewer tokens
+    est_high = (2 * n + 6) // 7    # more tokens
     return est_low, est_high
 
-def count_words(text: str) -> int:
-    # crude word count: split on whitespace
-    parts = re.split(r"\s+", text.strip())
-    return len([p for p in parts if p])
+def to_codepoints(text: str) -> np.ndarray:
+    # one UTF-32 buffer per file, shared by the counters below
+    return np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32)
+
+def count_words(cps: np.ndarray) -> int:
+    # crude word count: runs of non-whitespace (same split as str.split())
+    starts = ~np.isin(cps, WHITESPACE_CPS)
+    starts[1:] &= ~starts[:-1]
+    return int(np.count_nonzero(starts))
+
+def count_lines(cps: np.ndarray) -> int:
+    return int(np.count_nonzero(cps == 0x0A)) + (1 if cps.size else 0)
 
 def detect_article_markers(text: str) -> int:
     # count occurrences of المادة/مادة headings
-    return len(re.findall(r"(?:\n|^)\s*(?:المادة|مادة)\s+\(?\d+\)?", text))
-
-def count_arabic_ratio(text: str) -> float:
-    if not text:
-        return 0.0
-    arabic = len(ARABIC_LETTERS_RE.findall(text))
-    return arabic / max(1, len(text))
-
-def count_diacritics(text: str) -> int:
-    return len(ARABIC_DIACRITICS_RE.findall(text))
-
-def percentile(sorted_vals, p) -> float:
-    if not sorted_vals:
-        raise ValueError("Cannot calculate percentile of empty sequence")
-    k = (len(sorted_vals) - 1) * (p / 100.0)
-    f = math.floor(k)
-    c = math.ceil(k)
-    if f == c:
-        return sorted_vals[int(k)]
-    d0 = sorted_vals[f] * (c - k)
-    d1 = sorted_vals[c] * (k - f)
-    return d0 + d1
-
-def infer_category(root: Path, file_path: Path) -> str:
-    rel = file_path.relative_to(root)
+    return sum(1 for _ in ARTICLE_MARKER_RE.finditer(text))
+
+def count_arabic_chars(cps: np.ndarray) -> tuple[int, int]:
+    """
+    Return (arabic_letters, diacritics) from the file's codepoint buffer.
+    One range test selects the Arabic block; diacritics are a table lookup on that subset.
+    """
+    # unsigned wraparound folds the two range comparisons into one
+    offsets = cps - np.uint32(ARABIC_RANGE[0])
+    in_block = offsets <= ARABIC_RANGE[1] - ARABIC_RANGE[0]
+    arabic = int(np.count_nonzero(in_block))
+    if not arabic:
+        return 0, 0
+    return arabic, int(np.count_nonzero(ARABIC_DIACRITIC_LUT[offsets[in_block]]))
+
+class TextStats(NamedTuple):
+    lines: int
+    words: int
+    arabic: int
+    diacritics: int
+
+def text_stats(text: str) -> TextStats:
+    """
+    All codepoint counters for one text from a single shared buffer.
+    ASCII-only text (metadata/English) has no Arabic letters or diacritics,
+    so it skips the buffer and uses str.count/str.split.
+    """
+    if text.isascii():
+        return TextStats(text.count("\n") + (1 if text else 0), len(text.split()), 0, 0)
+    cps = to_codepoints(text)
+    return TextStats(count_lines(cps), count_words(cps), *count_arabic_chars(cps))
+
+def order_stats(arr: np.ndarray, ps) -> list[float]:
+    """
+    Percentiles ps (0-100, linear interpolation) of arr.
+    One np.partition (introselect) on just the needed ranks instead of a full sort.
+    """
+    n = arr.size
+    ranks = []
+    for p in ps:
+        k = (n - 1) * (p / 100.0)
+        ranks.append((k, math.floor(k), math.ceil(k)))
+    part = np.partition(arr, sorted({i for _, f, c in ranks for i in (f, c)}))
+    out = []
+    for k, f, c in ranks:
+        lo = float(part[f])
+        if f == c:
+            out.append(lo)
+            continue
+        # interpolate only when k falls between two ranks (same lerp form as np.percentile)
+        hi, t = float(part[c]), k - f
+        out.append(lo + (hi - lo) * t if t < 0.5 else hi - (hi - lo) * (1 - t))
+    return out
+
+class CategoryStats:
+    """
+    Running per-category char-length stats: exact count/total/min/max, and a
+    fixed-size uniform reservoir sample (Algorithm R) for median/p90/p95.
+    capacity=None keeps every value, giving exact quantiles.
+    """
+
+    def __init__(self, name: str, capacity=RESERVOIR_SIZE):
+        self.capacity = capacity
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+        self.sample = []
+        # seeded per category so runs over the same corpus agree
+        self.rng = random.Random(name)
+
+    def add(self, n: int) -> None:
+        self.count += 1
+        self.total += n
+        if self.min is None or n < self.min:
+            self.min = n
+        if self.max is None or n > self.max:
+            self.max = n
+        if self.capacity is None or len(self.sample) < self.capacity:
+            self.sample.append(n)
+        else:
+            j = self.rng.randrange(self.count)
+            if j < self.capacity:
+                self.sample[j] = n
+
+def infer_category(rel_path: str) -> str:
     # category = first folder name under root (common pattern)
-    return rel.parts[0] if len(rel.parts) > 0 else "UNKNOWN"
+    return rel_path.split(os.sep, 1)[0] if rel_path else "UNKNOWN"
+
+def iter_files(root: str, exts):
+    # single os.scandir traversal for all extensions (not one rglob per extension)
+    suffixes = tuple(exts)
+    with os.scandir(root) as it:
+        for entry in it:
+            if entry.is_dir(follow_symlinks=False):
+                yield from iter_files(entry.path, suffixes)
+            elif entry.name.endswith(suffixes) and entry.is_file():
+                yield entry.path
+
+def scan_file(fp: str, root_len: int, encoding: str, normalize: bool, fast: bool = False):
+    """
+    Read one file and compute its per-file stats row (tuple in FILE_FIELDS order);
+    returns None if it can't be read. fast=True only strips invisible marks (no whitespace pass).
+    Pure (no shared state), so it can run in a worker process.
+    """
+    try:
+        with open(fp, "rb") as f:
+            if os.fstat(f.fileno()).st_size >= MMAP_MIN_SIZE:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    raw = str(mm, encoding, "ignore")
+            else:
+                raw = f.read().decode(encoding, "ignore")
+    except Exception:
+        return None
+    if "\r" in raw:
+        # same newlines as text-mode reading
+        raw = raw.replace("\r\n", "\n").replace("\r", "\n")
+
+    if not normalize:
+        text = raw
+    elif fast:
+        text = raw.translate(INVISIBLE_MARKS_TABLE)
+    else:
+        text = normalize_text(raw)
+
+    rel = fp[root_len:]
+    category = infer_category(rel)
+    rel_path = rel.replace(os.sep, "/")
+
+    n_chars = len(text)
+    tok_low, tok_high = estimate_tokens(text) # type: ignore
+    n_lines, n_words, arabic, diacritics = text_stats(text)
+    # المادة headings need Arabic letters, so ASCII-only text can't contain any
+    article_markers = detect_article_markers(text) if arabic else 0
+    arabic_ratio = arabic / max(1, n_chars)
+
+    return (
+        category,
+        rel_path,
+        n_chars,
+        n_words,
+        n_lines,
+        tok_low,
+        tok_high,
+        round(arabic_ratio, 4),
+        diacritics,
+        article_markers,
+    )
 
-def iter_files(root: Path, exts):
-    for ext in exts:
-        yield from root.rglob(f"*{ext}")
+# scan_file options for pool workers; set once per process by init_scan_worker
+SCAN_OPTIONS = {}
+
+def init_scan_worker(root_len: int, encoding: str, normalize: bool, fast: bool) -> None:
+    SCAN_OPTIONS.update(root_len=root_len, encoding=encoding, normalize=normalize, fast=fast)
+
+def scan_worker(fp: str):
+    return scan_file(fp, **SCAN_OPTIONS)
 
 def main():
     ap = argparse.ArgumentParser(description="Scan qanoon text corpus and compute file/category statistics.")
@@ -74,8 +247,12 @@ def main():
     ap.add_argument("--ext", default=".txt,.text", help="Comma-separated list of file extensions to include.")
     ap.add_argument("--encoding", default="utf-8", help="Text encoding to try first.")
     ap.add_argument("--no-normalize", action="store_true", help="Do not normalize whitespace/BOM before stats.")
+    ap.add_argument("--fast", action="store_true", help="Only strip BOM/RTL marks, skipping whitespace normalization (words/article markers unchanged; chars, lines and token estimates count raw whitespace, which also lowers arabic_ratio since its denominator is chars).")
     ap.add_argument("--outdir", default="./corpus_stats", help="Directory to write CSV outputs.")
     ap.add_argument("--sample-n", type=int, default=0, help="If >0, print N sample longest files per category.")
+    ap.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) - 1),
+                    help="Number of worker processes used to read and scan files (default: all cores but one).")
+    ap.add_argument("--exact-quantiles", action="store_true", help=f"Keep every char length for exact quantiles (default samples {RESERVOIR_SIZE} per category).")
     args = ap.parse_args()
 
     root = Path(args.root).expanduser().resolve()
@@ -83,104 +260,83 @@ def main():
     outdir = Path(args.outdir)
     outdir.mkdir(parents=True, exist_ok=True)
 
-    file_rows = []
-    cat_map = {}  # category -> list of char lengths
+    # Rows go straight to files.csv; --sample-n keeps only a bounded heap per category
+    sample_n = max(0, args.sample_n or 0)
+    cat_top = {}  # category -> min-heap of (chars, -seq, row), at most sample_n entries
+    cat_map = {}  # category -> CategoryStats
 
     total_files = 0
     unreadable = 0
+    n_rows = 0
 
-    for fp in iter_files(root, exts):
-        total_files += 1
-        try:
-            raw = fp.read_text(encoding=args.encoding, errors="ignore")
-        except Exception:
-            unreadable += 1
-            continue
-
-        text = raw if args.no_normalize else normalize_text(raw)
-
-        category = infer_category(root, fp)
-        rel_path = fp.relative_to(root).as_posix()
-
-        n_chars = len(text)
-        n_lines = text.count("\n") + (1 if text else 0)
-        n_words = count_words(text)
-        tok_low, tok_high = estimate_tokens(text) # type: ignore
-        arabic_ratio = count_arabic_ratio(text)
-        diacritics = count_diacritics(text)
-        article_markers = detect_article_markers(text)
-
-        file_rows.append({
-            "category": category,
-            "rel_path": rel_path,
-            "chars": n_chars,
-            "words": n_words,
-            "lines": n_lines,
-            "tok_est_low": tok_low,
-            "tok_est_high": tok_high,
-            "arabic_ratio": round(arabic_ratio, 4),
-            "diacritics_count": diacritics,
-            "article_markers": article_markers,
-        })
-
-        cat_map.setdefault(category, []).append(n_chars)
-
-    # Write per-file CSV
     files_csv = outdir / "files.csv"
-    with files_csv.open("w", encoding="utf-8", newline="") as f:
-        w = csv.DictWriter(f, fieldnames=list(file_rows[0].keys()) if file_rows else [
-            "category","rel_path","chars","words","lines","tok_est_low","tok_est_high","arabic_ratio","diacritics_count","article_markers"
-        ])
-        w.writeheader()
-        for r in file_rows:
-            w.writerow(r)
+    # Decoding, normalization and counting are CPU-bound: shard files across processes.
+    # imap keeps walk order, so output (and reservoir sampling) doesn't depend on --workers.
+    init_args = (len(os.path.join(str(root), "")), args.encoding, not args.no_normalize, args.fast)
+    with files_csv.open("w", encoding="utf-8", newline="", buffering=WRITE_BUFFER_SIZE) as f, \
+            mp.Pool(max(1, args.workers), initializer=init_scan_worker, initargs=init_args) as pool:
+        w = csv.writer(f)
+        w.writerow(FILE_FIELDS)
+        for row in pool.imap(scan_worker, iter_files(str(root), exts), chunksize=128):
+            total_files += 1
+            if row is None:
+                unreadable += 1
+                continue
+            w.writerow(row)
+            n_rows += 1
+            cs = cat_map.get(row[0])
+            if cs is None:
+                cs = cat_map[row[0]] = CategoryStats(row[0], None if args.exact_quantiles else RESERVOIR_SIZE)
+                cat_top[row[0]] = []
+            cs.add(row[2])
+            if sample_n:
+                # -seq: on equal chars the earlier file ranks higher (and is evicted last)
+                top = cat_top[row[0]]
+                if len(top) < sample_n:
+                    heapq.heappush(top, (row[2], -n_rows, row))
+                elif row[2] > top[0][0]:
+                    heapq.heapreplace(top, (row[2], -n_rows, row))
 
     # Per-category summary
     cat_rows = []
-    for cat, lens in sorted(cat_map.items(), key=lambda x: x[0].lower()):
-        lens_sorted = sorted(lens)
-        cat_rows.append({
-            "category": cat,
-            "files": len(lens_sorted),
-            "total_chars": sum(lens_sorted),
-            "min_chars": lens_sorted[0],
-            "median_chars": int(median(lens_sorted)),
-            "p90_chars": int(percentile(lens_sorted, 90)),
-            "p95_chars": int(percentile(lens_sorted, 95)),
-            "max_chars": lens_sorted[-1],
-        })
+    for cat, cs in sorted(cat_map.items(), key=lambda x: x[0].lower()):
+        med, p90, p95 = order_stats(np.array(cs.sample, dtype=np.int64), (50, 90, 95))
+        cat_rows.append((
+            cat,
+            cs.count,
+            cs.total,
+            cs.min,
+            int(med),
+            int(p90),
+            int(p95),
+            cs.max,
+        ))
 
     cats_csv = outdir / "categories.csv"
     with cats_csv.open("w", encoding="utf-8", newline="") as f:
-        w = csv.DictWriter(f, fieldnames=[
-            "category","files","total_chars","min_chars","median_chars","p90_chars","p95_chars","max_chars"
-        ])
-        w.writeheader()
-        for r in cat_rows:
-            w.writerow(r)
+        w = csv.writer(f)
+        w.writerow(CATEGORY_FIELDS)
+        w.writerows(cat_rows)
 
     # Console summary
     print("\n=== Corpus Scan Summary ===")
     print(f"Root: {root}")
     print(f"Extensions: {exts}")
     print(f"Total files matched: {total_files}")
-    print(f"Readable records written: {len(file_rows)}")
+    print(f"Readable records written: {n_rows}")
     print(f"Unreadable (skipped): {unreadable}")
     print(f"Unique categories: {len(cat_rows)}")
     print(f"Per-file CSV: {files_csv}")
     print(f"Per-category CSV: {cats_csv}")
 
     # Optional: show top longest files per category
-    if args.sample_n and args.sample_n > 0 and file_rows:
+    if sample_n and n_rows:
         print("\n=== Longest file samples per category ===")
-        by_cat = {}
-        for r in file_rows:
-            by_cat.setdefault(r["category"], []).append(r)
-        for cat in sorted(by_cat.keys(), key=lambda x: x.lower()):
-            rows = sorted(by_cat[cat], key=lambda r: r["chars"], reverse=True)[:args.sample_n]
+        for cat in sorted(cat_top.keys(), key=lambda x: x.lower()):
+            rows = [row for _, _, row in sorted(cat_top[cat], reverse=True)]
             print(f"\n[{cat}] top {len(rows)} longest")
-            for rr in rows:
-                print(f"  chars={rr['chars']:>8}  tok~{rr['tok_est_low']}-{rr['tok_est_high']:<7}  articles={rr['article_markers']:<4}  {rr['rel_path']}")
+            for _, rel_path, n_chars, _, _, tok_low, tok_high, _, _, articles in rows:
+                print(f"  chars={n_chars:>8}  tok~{tok_low}-{tok_high:<7}  articles={articles:<4}  {rel_path}")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,25 @@
+import time
+import unittest
+
+from clean_qnoon_collection import strip_leading_download_lines
+
+
+class StripLeadingDownloadLinesTest(unittest.TestCase):
+    def test_strips_leading_download_lines(self):
+        text = "تحميل\n  English \n\nنص القانون\nتحميل"
+        self.assertEqual(strip_leading_download_lines(text), ("نص القانون\nتحميل", 3))
+
+    def test_only_download_lines(self):
+        self.assertEqual(strip_leading_download_lines("تحميل\nتحميل\n"), ("", 3))
+
+    def test_long_blank_first_line_is_linear(self):
+        # A quadratic regex takes minutes here; linear matching is a few milliseconds
+        text = " " * 200_000 + "x\n"
+        start = time.perf_counter()
+        cleaned, removed = strip_leading_download_lines(text)
+        self.assertLess(time.perf_counter() - start, 1.0)
+        self.assertEqual((cleaned, removed), ("x", 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+import re
+import unittest
+
+from prepare_axolotl_cpt import chunk_text_paragraphwise, decode_normalized, normalize_newlines
+
+
+def baseline_chunks(text, max_chars, overlap_chars):
+    # Original implementation: split on blank lines, strip and re-join paragraphs
+    paras = [p.strip() for p in re.split(r"\n\s*\n", text) if p.strip()]
+    chunks = []
+    buf = ""
+    for p in paras:
+        if not buf:
+            buf = p
+        elif len(buf) + len(p) + 2 <= max_chars:
+            buf = buf + "\n\n" + p
+        else:
+            chunks.append(buf.strip())
+            tail = buf[-overlap_chars:] if overlap_chars > 0 else ""
+            buf = (tail + "\n\n" + p).strip()
+    if buf:
+        chunks.append(buf.strip())
+    hardened = []
+    for c in chunks:
+        if len(c) <= max_chars:
+            hardened.append(c)
+            continue
+        start = 0
+        while start < len(c):
+            end = min(start + max_chars, len(c))
+            hardened.append(c[start:end].strip())
+            if end >= len(c):
+                break
+            start = max(0, end - overlap_chars)
+    return [c for c in hardened if c]
+
+
+class ChunkTextParagraphwiseTest(unittest.TestCase):
+    SHORT_TEXTS = [
+        "",
+        "   ",
+        "فقرة واحدة",
+        "para1 \n\npara2",
+        "a\n \nb",
+        "المادة (1)\n\n فقرة مزاحة",
+        "  first\n\n\n  second  \n",
+        "line one\nline two",
+    ]
+
+    def test_short_texts_match_baseline(self):
+        for text in self.SHORT_TEXTS:
+            with self.subTest(text=text):
+                self.assertEqual(chunk_text_paragraphwise(text, 200, 20), baseline_chunks(text, 200, 20))
+
+    def test_paragraph_edges_are_normalized(self):
+        self.assertEqual(chunk_text_paragraphwise("para1 \n\npara2", 200, 20), ["para1\n\npara2"])
+        self.assertEqual(chunk_text_paragraphwise("a\n \nb", 200, 20), ["a\n\nb"])
+
+    def test_long_text_matches_baseline(self):
+        text = "\n\n".join(f" فقرة رقم {i} " + "نص " * (i % 7) for i in range(60))
+        self.assertEqual(chunk_text_paragraphwise(text, 120, 30), baseline_chunks(text, 120, 30))
+
+
+class DecodeNormalizedTest(unittest.TestCase):
+    def test_matches_decode_then_normalize(self):
+        cases = [
+            "\ufeffالمادة (1)\r\nنص\u200f القانون\r".encode("utf-8"),
+            # invalid bytes around a mark / inside CRLF must not be joined into new characters
+            b"\xd8\xe2\x80\x8f\xa7 x",
+            b"a\r\xe2\n\xd8\x80\xef\xbb\xbf\xd8 ",
+        ]
+        for data in cases:
+            with self.subTest(data=data):
+                self.assertEqual(decode_normalized(data), normalize_newlines(data.decode("utf-8", errors="ignore")))
+        self.assertEqual(decode_normalized(b"\xd8\xe2\x80\x8f\xa7 x"), "x")
+
+
+if __name__ == "__main__":
+    unittest.main()